@@ -0,0 +1,225 @@
+# autotune.py
+"""
+Memory-budgeted CMS auto-tuning from a sample of the key stream.
+
+For every depth d in the candidate list, w is the widest table that fits the
+byte budget. CMS.table is a Python list of ints, so a counter costs one list
+slot (8 bytes) plus its int object once it leaves CPython's small-int cache
+(COUNTER_BYTES in total). Each (w, d, use_cu) setting is run as a quick trial
+sketch over the sample in a worker process, and every estimator
+(min / mean / cmm) is scored on the same sketch, since the estimator only
+changes the query side.
+
+Throughput is not measured in the pool, where workers compete for cores.
+Only the settings that are still in the running after the error pass are
+re-timed afterwards, one after another. Rows that were not timed report
+updates_per_sec / qps as nan.
+
+Selection:
+- no error target : lowest p95 absolute error (ties -> higher updates/s)
+- error target    : highest updates/s among settings with p95 <= target
+                    (falls back to lowest p95 if none meets it)
+
+Usage:
+  python autotune.py --budget 65536 --workload zipf --alpha 1.0 --N 200000
+  python autotune.py --budget 65536 --error_target 5 --apply http://127.0.0.1:8000
+"""
+
+import argparse, csv, json, random, sys, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from benchmark import pct
+from cms import CMS
+from workloads import UniformKeys, ZipfKeys
+
+COUNTER_BYTES = 8 + sys.getsizeof(1 << 20)   # list slot + int object (36 on 64-bit CPython)
+DEFAULT_DEPTHS = (1, 2, 3, 4, 5, 6, 7, 8)
+ESTIMATORS = ("min", "mean", "cmm")
+
+
+def candidate_settings(budget_bytes: int, depths: Sequence[int] = DEFAULT_DEPTHS,
+                       cu_options: Sequence[bool] = (False, True)) -> List[Tuple[int, int, bool]]:
+    """(w, d, use_cu) settings whose w*d counters fit in budget_bytes."""
+    out = []
+    for d in depths:
+        w = budget_bytes // (COUNTER_BYTES * d)
+        if w < 2:
+            continue
+        for cu in cu_options:
+            out.append((w, d, cu))
+    if not out:
+        raise ValueError(f"budget of {budget_bytes} bytes is too small for any candidate depth")
+    return out
+
+
+def _query_keys(truth: Counter, Q: int, seed: int) -> List[int]:
+    # 一半已出现的键、一半未出现的键（与 benchmark.py 一致）
+    rng = random.Random(seed)
+    seen = list(truth.keys())
+    keys = [seen[rng.randrange(len(seen))] for _ in range(Q // 2)] if seen else []
+    while len(keys) < Q:
+        k = rng.getrandbits(62)
+        if k not in truth:
+            keys.append(k)
+    return keys
+
+
+def _build(w: int, d: int, use_cu: bool, sample: Sequence[int], seed: int) -> Tuple[CMS, float]:
+    cms = CMS.from_w_d(w, d, seed=seed)
+    upd = cms.update_cu if use_cu else cms.update
+    t0 = time.perf_counter()
+    for k in sample:
+        upd(k, 1)
+    t1 = time.perf_counter()
+    return cms, len(sample) / (t1 - t0 + 1e-9)
+
+
+def run_setting(w: int, d: int, use_cu: bool, sample: Sequence[int],
+                Q: int = 2000, seed: int = 1) -> List[Dict]:
+    """Error pass: one trial sketch over the sample; one result row per estimator."""
+    cms, _ = _build(w, d, use_cu, sample, seed)
+    truth = Counter(sample)
+    keys = _query_keys(truth, Q, seed)
+    rows = []
+    for est in ESTIMATORS:
+        query = getattr(cms, f"query_{est}")
+        errs = [abs(query(k) - truth[k]) for k in keys]
+        rows.append({
+            "w": w, "d": d, "use_cu": use_cu, "estimator": est,
+            "bytes": w * d * COUNTER_BYTES,
+            "updates_per_sec": float("nan"), "qps": float("nan"),
+            "med_err": pct(errs, 0.5), "p95_err": pct(errs, 0.95),
+        })
+    return rows
+
+
+def time_setting(w: int, d: int, use_cu: bool, sample: Sequence[int],
+                 Q: int = 2000, seed: int = 1) -> Tuple[float, Dict[str, float]]:
+    """Throughput pass (run serially): updates/s and per-estimator queries/s."""
+    cms, updates_per_sec = _build(w, d, use_cu, sample, seed)
+    keys = _query_keys(Counter(sample), Q, seed)
+    qps = {}
+    for est in ESTIMATORS:
+        query = getattr(cms, f"query_{est}")
+        t0 = time.perf_counter()
+        for k in keys:
+            query(k)
+        t1 = time.perf_counter()
+        qps[est] = len(keys) / (t1 - t0 + 1e-9)
+    return updates_per_sec, qps
+
+
+def _contenders(rows: List[Dict], error_target: Optional[float]) -> List[Dict]:
+    """Rows select() may still rank by throughput."""
+    if error_target is not None:
+        ok = [r for r in rows if r["p95_err"] <= error_target]
+        if ok:
+            return ok
+    best = min(r["p95_err"] for r in rows)
+    return [r for r in rows if r["p95_err"] == best]
+
+
+def _run_setting_args(args):
+    return run_setting(*args)
+
+
+def select(rows: List[Dict], error_target: Optional[float] = None) -> Dict:
+    """Pick the winning row (see module docstring); adds met_target."""
+    rows = _contenders(rows, error_target)
+    if error_target is not None:
+        ok = [r for r in rows if r["p95_err"] <= error_target]
+        if ok:
+            best = max(ok, key=lambda r: (r["updates_per_sec"], r["qps"], -r["p95_err"]))
+            return dict(best, met_target=True)
+    best = min(rows, key=lambda r: (r["p95_err"], -r["updates_per_sec"]))
+    return dict(best, met_target=error_target is None)
+
+
+def autotune(budget_bytes: int, sample: Sequence[int], error_target: Optional[float] = None,
+             depths: Sequence[int] = DEFAULT_DEPTHS, cu_options: Sequence[bool] = (False, True),
+             Q: int = 2000, seed: int = 1, workers: Optional[int] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Score errors of all candidate settings in parallel, then time the
+    contenders serially; returns (chosen, all_rows).
+    """
+    sample = list(sample)
+    settings = candidate_settings(budget_bytes, depths, cu_options)
+    jobs = [(w, d, cu, sample, Q, seed) for w, d, cu in settings]
+    rows: List[Dict] = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for part in ex.map(_run_setting_args, jobs):
+            rows.extend(part)
+
+    contenders = _contenders(rows, error_target)
+    for w, d, cu in dict.fromkeys((r["w"], r["d"], r["use_cu"]) for r in contenders):
+        updates_per_sec, qps = time_setting(w, d, cu, sample, Q, seed)
+        for r in rows:
+            if (r["w"], r["d"], r["use_cu"]) == (w, d, cu):
+                r["updates_per_sec"] = updates_per_sec
+                r["qps"] = qps[r["estimator"]]
+    return select(rows, error_target), rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget", type=int, required=True,
+                    help=f"sketch table memory budget in bytes ({COUNTER_BYTES} bytes per Python-int counter)")
+    ap.add_argument("--N", type=int, default=200000, help="sample size (number of keys)")
+    ap.add_argument("--U", type=int, default=100000, help="key space size")
+    ap.add_argument("--workload", type=str, choices=["uniform","zipf"], default="zipf")
+    ap.add_argument("--alpha", type=float, default=1.0, help="zipf alpha")
+    ap.add_argument("--sample_file", type=str, default=None,
+                    help="one integer key per line; overrides --workload")
+    ap.add_argument("--error_target", type=float, default=None,
+                    help="p95 abs error target; pick the fastest setting that meets it")
+    ap.add_argument("--depths", type=str, default=",".join(map(str, DEFAULT_DEPTHS)))
+    ap.add_argument("--Q", type=int, default=2000, help="num queries for error stats")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", type=str, default=None, help="optional CSV of all trial rows")
+    ap.add_argument("--apply", type=str, default=None,
+                    help="server base URL; POST the chosen setting to /reset")
+    args = ap.parse_args()
+
+    if args.sample_file:
+        with open(args.sample_file) as f:
+            sample = [int(line) for line in f if line.strip()]
+    else:
+        gen = (UniformKeys(U=args.U, seed=args.seed) if args.workload == "uniform"
+               else ZipfKeys(U=args.U, alpha=args.alpha, seed=args.seed))
+        sample = [gen.sample() for _ in range(args.N)]
+
+    depths = [int(x) for x in args.depths.split(",") if x]
+    try:
+        candidate_settings(args.budget, depths)
+    except ValueError as e:
+        ap.error(str(e))
+    best, rows = autotune(args.budget, sample, args.error_target, depths=depths,
+                          Q=args.Q, seed=args.seed, workers=args.workers)
+
+    for r in sorted(rows, key=lambda r: (r["d"], r["use_cu"], r["estimator"])):
+        print(f"w={r['w']:>7} d={r['d']} cu={int(r['use_cu'])} {r['estimator']:<4}  "
+              f"p95={r['p95_err']:.2f} med={r['med_err']:.2f}  u/s={r['updates_per_sec']:.0f}  qps={r['qps']:.0f}")
+    if not best["met_target"]:
+        print(f"[warn] no setting meets p95 <= {args.error_target}; using lowest p95")
+    print("[chosen]", json.dumps(best))
+
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            w.writeheader()
+            w.writerows(rows)
+        print(f"[done] wrote {args.out}")
+
+    if args.apply:
+        import requests
+        payload = {"w": best["w"], "d": best["d"], "use_cu": best["use_cu"],
+                   "estimator": best["estimator"], "seed": args.seed}
+        r = requests.post(f"{args.apply.rstrip('/')}/reset", json=payload)
+        print("reset:", r.json())
+
+
+if __name__ == "__main__":
+    main()
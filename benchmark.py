@@ -1,8 +1,10 @@
 # benchmark.py
-import argparse, time, csv, math, random
+import argparse, time, csv, math, random, os, threading
 from collections import Counter
-from typing import List, Tuple
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
 from cms import CMS
+from profiling import StackSampler
 from workloads import UniformKeys, ZipfKeys
 
 def pct(vs: List[float], q: float) -> float:
@@ -16,11 +18,24 @@ def pct(vs: List[float], q: float) -> float:
 def summarize(errors: List[float]) -> Tuple[float,float,float]:
     return pct(errors, 0.5), (pct(errors, 0.75)-pct(errors, 0.25)), pct(errors, 0.95)
 
-def run_one_trial(eps, delta, N, U, workload, alpha, use_cu, Q, seed):
+@contextmanager
+def profile_phase(prefix: Optional[str], phase: str):
+    """Sample the calling thread for the duration of one phase -> <prefix>_<phase>.collapsed"""
+    if prefix is None:
+        yield
+        return
+    sampler = StackSampler(thread_ids=[threading.get_ident()])
+    with sampler:
+        yield
+    path = f"{prefix}_{phase}.collapsed"
+    sampler.write_collapsed(path)
+    print(f"[profile] {phase}: {sampler.samples} samples -> {path}")
+
+def run_one_trial(eps, delta, N, U, workload, alpha, use_cu, Q, seed, profile_prefix=None, cache_size=0):
     rng = random.Random(seed)
 
     # 构建 CMS
-    cms = CMS.from_eps_delta(eps, delta, seed=seed)
+    cms = CMS.from_eps_delta(eps, delta, seed=seed, cache_size=cache_size)
     truth = Counter()
 
     hot_key, hot_count = 123456789, 1000
@@ -39,13 +54,25 @@ def run_one_trial(eps, delta, N, U, workload, alpha, use_cu, Q, seed):
     else:
         raise ValueError("workload must be uniform|zipf")
 
-    t0 = time.perf_counter()
-    for _ in range(N):
-        k = sampler()
-        if use_cu: cms.update_cu(k, 1)
-        else:      cms.update(k, 1)
-        truth[k] += 1
-    t1 = time.perf_counter()
+    if profile_prefix is None:
+        t0 = time.perf_counter()
+        for _ in range(N):
+            k = sampler()
+            if use_cu: cms.update_cu(k, 1)
+            else:      cms.update(k, 1)
+            truth[k] += 1
+        t1 = time.perf_counter()
+    else:
+        # 分析模式：先生成键再更新，使两个阶段各自单独采样
+        with profile_phase(profile_prefix, "generation"):
+            keys = [sampler() for _ in range(N)]
+        with profile_phase(profile_prefix, "update"):
+            t0 = time.perf_counter()
+            for k in keys:
+                if use_cu: cms.update_cu(k, 1)
+                else:      cms.update(k, 1)
+                truth[k] += 1
+            t1 = time.perf_counter()
     updates_per_sec = N / (t1 - t0 + 1e-9)
 
     seen_keys = list(truth.keys())
@@ -57,17 +84,18 @@ def run_one_trial(eps, delta, N, U, workload, alpha, use_cu, Q, seed):
     query_keys = seen_sample + unseen_sample
 
     abs_err_min, abs_err_mean, abs_err_cmm = [], [], []
-    t2 = time.perf_counter()
-    for k in query_keys:
-        true = truth[k]
-        est_min  = cms.query_min(k)
-        est_mean = cms.query_mean(k)
-        est_cmm  = cms.query_cmm(k)
-
-        abs_err_min.append(abs(est_min - true))
-        abs_err_mean.append(abs(est_mean - true))
-        abs_err_cmm.append(abs(est_cmm - true))
-    t3 = time.perf_counter()
+    with profile_phase(profile_prefix, "query"):
+        t2 = time.perf_counter()
+        for k in query_keys:
+            true = truth[k]
+            est_min  = cms.query_min(k)
+            est_mean = cms.query_mean(k)
+            est_cmm  = cms.query_cmm(k)
+
+            abs_err_min.append(abs(est_min - true))
+            abs_err_mean.append(abs(est_mean - true))
+            abs_err_cmm.append(abs(est_cmm - true))
+        t3 = time.perf_counter()
     qps = len(query_keys) / (t3 - t2 + 1e-9)
 
     med_min, iqr_min, p95_min   = summarize(abs_err_min)
@@ -80,7 +108,43 @@ def run_one_trial(eps, delta, N, U, workload, alpha, use_cu, Q, seed):
         "med_min": med_min, "iqr_min": iqr_min, "p95_min": p95_min,
         "med_mean": med_mean, "iqr_mean": iqr_mean, "p95_mean": p95_mean,
         "med_cmm": med_cmm, "iqr_cmm": iqr_cmm, "p95_cmm": p95_cmm,
-        "w": cms.w, "d": cms.d
+        "w": cms.w, "d": cms.d,
+        "cache_size": cache_size, "cache_hit_rate": cms.cache_stats()["cache_hit_rate"]
+    }
+
+def run_diff_trial(eps, delta, N, U, alpha, use_cu, shift, k, seed, cache_size=0):
+    """两个时段：Zipf(alpha) 与排名平移 shift 后的 Zipf(alpha)，评估 top-k 变化检测的召回率"""
+    from sketch_diff import heavy_changes  # 需要 numpy
+
+    old = CMS.from_eps_delta(eps, delta, seed=seed, cache_size=cache_size)
+    new = CMS.from_eps_delta(eps, delta, seed=seed, cache_size=cache_size)
+    t_old, t_new = Counter(), Counter()
+    for cms, truth, off, s in ((old, t_old, 0, seed+1), (new, t_new, shift, seed+2)):
+        gen = ZipfKeys(U=U, alpha=alpha, seed=s, offset=off)
+        upd = cms.update_cu if use_cu else cms.update
+        for _ in range(N):
+            key = gen.sample()
+            upd(key, 1)
+            truth[key] += 1
+
+    candidates = list(set(t_old) | set(t_new))
+    t0 = time.perf_counter()
+    res = heavy_changes(old, new, candidates, k=k)
+    t1 = time.perf_counter()
+
+    change = {key: t_new[key] - t_old[key] for key in candidates}
+    ranked = sorted(candidates, key=lambda key: change[key])
+    true_dec = {key for key in ranked[:k] if change[key] < 0}
+    true_inc = {key for key in ranked[::-1][:k] if change[key] > 0}
+    est_inc = {key for key, _ in res["increases"]}
+    est_dec = {key for key, _ in res["decreases"]}
+
+    return {
+        "recall_inc": len(est_inc & true_inc) / max(1, len(true_inc)),
+        "recall_dec": len(est_dec & true_dec) / max(1, len(true_dec)),
+        "diff_ms": (t1 - t0) * 1000.0,
+        "num_candidates": len(candidates),
+        "w": old.w, "d": old.d
     }
 
 def main():
@@ -96,29 +160,77 @@ def main():
     ap.add_argument("--trials", type=int, default=3)
     ap.add_argument("--seed", type=int, default=7)
     ap.add_argument("--out", type=str, default="results.csv")
+    ap.add_argument("--mode", type=str, choices=["accuracy","diff"], default="accuracy",
+                    help="accuracy: point-query error/throughput; diff: heavy-change recall "
+                         "between zipf and rank-shifted zipf periods")
+    ap.add_argument("--shift", type=int, default=10, help="diff mode: zipf rank shift of period 2")
+    ap.add_argument("--k", type=int, default=20, help="diff mode: top-k changes evaluated")
+    ap.add_argument("--cache_size", type=int, default=0,
+                    help="hot-key index cache capacity (0 = disabled)")
+    ap.add_argument("--profile", action="store_true",
+                    help="sample each trial's generation/update/query phases into "
+                         "<out>_trial<t>_<phase>.collapsed (phases then run separately, "
+                         "so updates_per_sec excludes key generation and runs under the sampler; "
+                         "such rows are marked profile=1)")
     args = ap.parse_args()
 
+    if args.mode == "diff":
+        if args.profile:
+            ap.error("--profile is not supported with --mode diff")
+        if args.k < 1:
+            ap.error("--k must be >= 1")
+        run_diff(args)
+        return
+
     rows = []
     for t in range(args.trials):
         r = run_one_trial(
             eps=args.eps, delta=args.delta, N=args.N, U=args.U,
             workload=args.workload, alpha=args.alpha,
-            use_cu=args.use_cu, Q=args.Q, seed=args.seed + t*100
+            use_cu=args.use_cu, Q=args.Q, seed=args.seed + t*100,
+            profile_prefix=f"{os.path.splitext(args.out)[0]}_trial{t}" if args.profile else None,
+            cache_size=args.cache_size
         )
         r.update({
             "eps": args.eps, "delta": args.delta, "N": args.N, "U": args.U,
             "workload": args.workload, "alpha": args.alpha, "use_cu": int(args.use_cu),
-            "trial": t
+            "profile": int(args.profile), "trial": t
         })
         rows.append(r)
         print(f"[trial {t}] w={r['w']} d={r['d']}  u/s={r['updates_per_sec']:.0f}  qps={r['qps']:.0f}  "
-              f"med_min={r['med_min']:.2f} med_cmm={r['med_cmm']:.2f}")
+              f"med_min={r['med_min']:.2f} med_cmm={r['med_cmm']:.2f}  hit={r['cache_hit_rate']:.3f}")
 
     fieldnames = ["trial","eps","delta","N","U","workload","alpha","use_cu","w","d",
                   "updates_per_sec","qps",
                   "med_min","iqr_min","p95_min",
                   "med_mean","iqr_mean","p95_mean",
-                  "med_cmm","iqr_cmm","p95_cmm"]
+                  "med_cmm","iqr_cmm","p95_cmm",
+                  "cache_size","cache_hit_rate","profile"]
+    with open(args.out, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w.writeheader()
+        w.writerows(rows)
+    print(f"[done] wrote {args.out}")
+
+def run_diff(args):
+    rows = []
+    for t in range(args.trials):
+        r = run_diff_trial(
+            eps=args.eps, delta=args.delta, N=args.N, U=args.U, alpha=args.alpha,
+            use_cu=args.use_cu, shift=args.shift, k=args.k, seed=args.seed + t*100,
+            cache_size=args.cache_size
+        )
+        r.update({
+            "eps": args.eps, "delta": args.delta, "N": args.N, "U": args.U,
+            "alpha": args.alpha, "use_cu": int(args.use_cu), "shift": args.shift,
+            "k": args.k, "trial": t
+        })
+        rows.append(r)
+        print(f"[trial {t}] w={r['w']} d={r['d']}  recall_inc={r['recall_inc']:.2f}  "
+              f"recall_dec={r['recall_dec']:.2f}  diff_ms={r['diff_ms']:.1f}")
+
+    fieldnames = ["trial","eps","delta","N","U","alpha","use_cu","shift","k","w","d",
+                  "num_candidates","recall_inc","recall_dec","diff_ms"]
     with open(args.out, "w", newline="") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames)
         w.writeheader()
@@ -1,7 +1,8 @@
 # cms.py
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import random
+import sys
 
 def multiply_shift_hash(x: int, seed: int, w: int) -> int:
     a = (seed * 0x9E3779B97F4A7C15) & ((1 << 64) - 1)
@@ -9,6 +10,71 @@ def multiply_shift_hash(x: int, seed: int, w: int) -> int:
     z = (a * (x | 1)) & ((1 << 64) - 1)
     return ((z >> 32) ^ (z & 0xFFFFFFFF)) % w
 
+class IndexCache:
+    """
+    Bounded key -> (d table offsets) cache with CLOCK eviction.
+    New entries start with ref=0, so one-off keys are evicted before hot ones.
+    """
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be > 0")
+        self.capacity = capacity
+        self.slots: Dict[int, int] = {}
+        self.keys: List[int] = []
+        self.vals: List[Tuple[int, ...]] = []
+        self.ref = bytearray(capacity)
+        self.hand = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: int) -> Optional[Tuple[int, ...]]:
+        slot = self.slots.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.ref[slot] = 1
+        self.hits += 1
+        return self.vals[slot]
+
+    def put(self, key: int, idxs: Tuple[int, ...]) -> None:
+        if len(self.keys) < self.capacity:
+            self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.vals.append(idxs)
+            return
+        # 时钟指针：清掉引用位直到找到可淘汰的槽
+        ref, cap = self.ref, self.capacity
+        while ref[self.hand]:
+            ref[self.hand] = 0
+            self.hand = (self.hand + 1) % cap
+        slot = self.hand
+        del self.slots[self.keys[slot]]
+        self.slots[key] = slot
+        self.keys[slot] = key
+        self.vals[slot] = idxs
+        self.hand = (slot + 1) % cap
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: containers + cached keys and offset tuples."""
+        n = len(self.keys)
+        per_entry = 0
+        if n:
+            t = self.vals[0]
+            per_entry = sys.getsizeof(self.keys[0]) + sys.getsizeof(t) + sum(sys.getsizeof(i) for i in t)
+        return (sys.getsizeof(self.slots) + sys.getsizeof(self.keys) + sys.getsizeof(self.vals)
+                + sys.getsizeof(self.ref) + n * per_entry)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cache_size": self.capacity,
+            "cache_entries": len(self.keys),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            "cache_bytes": self.memory_bytes(),
+        }
+
 @dataclass
 class CMS:
     w: int
@@ -17,31 +83,50 @@ class CMS:
     table: List[int]
     total_updates: int = 0         
     row_totals: Optional[List[int]] = None  
+    idx_cache: Optional[IndexCache] = None   # 可选热键索引缓存
 
     @classmethod
-    def from_eps_delta(cls, eps: float, delta: float, seed: int = 1):
+    def from_eps_delta(cls, eps: float, delta: float, seed: int = 1, cache_size: int = 0):
         import math
         w = int(math.ceil(2.718281828 / eps))
         d = int(math.ceil(math.log(1.0 / delta)))
+        return cls.from_w_d(w, d, seed=seed, cache_size=cache_size)
+
+    @classmethod
+    def from_w_d(cls, w: int, d: int, seed: int = 1, cache_size: int = 0):
+        # 直接指定表宽/深度（例如由 autotune.py 按内存预算选出）
         rng = random.Random(seed)
         seeds = [rng.getrandbits(64) for _ in range(d)]
         table = [0] * (w * d)
         row_totals = [0] * d                     
-        return cls(w=w, d=d, seeds=seeds, table=table, row_totals=row_totals)
+        idx_cache = IndexCache(cache_size) if cache_size > 0 else None
+        return cls(w=w, d=d, seeds=seeds, table=table, row_totals=row_totals, idx_cache=idx_cache)
 
     def _idx(self, r: int, key: int) -> int:
         h = multiply_shift_hash(key, self.seeds[r], self.w)
         return r * self.w + h
 
+    def _idxs(self, key: int) -> Tuple[int, ...]:
+        """All d table offsets of key, served from idx_cache when enabled."""
+        cache = self.idx_cache
+        if cache is not None:
+            idxs = cache.get(key)
+            if idxs is not None:
+                return idxs
+        idxs = tuple(self._idx(r, key) for r in range(self.d))
+        if cache is not None:
+            cache.put(key, idxs)
+        return idxs
+
     def update(self, key: int, c: int = 1) -> None:
-        for r in range(self.d):
-            self.table[self._idx(r, key)] += c
+        for r, idx in enumerate(self._idxs(key)):
+            self.table[idx] += c
             self.row_totals[r] += c              
         self.total_updates += c
 
     # 保守更新（CU）
     def update_cu(self, key: int, c: int = 1) -> None:
-        idxs = [self._idx(r, key) for r in range(self.d)]
+        idxs = self._idxs(key)
         vals = [self.table[idx] for idx in idxs]
         m = min(vals)
         for r, (idx, v) in enumerate(zip(idxs, vals)):
@@ -52,15 +137,15 @@ class CMS:
 
     # 估计器
     def query_min(self, key: int) -> int:
-        return min(self.table[self._idx(r, key)] for r in range(self.d))
+        return min(self.table[idx] for idx in self._idxs(key))
 
     def query_mean(self, key: int) -> float:
-        return sum(self.table[self._idx(r, key)] for r in range(self.d)) / self.d
+        return sum(self.table[idx] for idx in self._idxs(key)) / self.d
 
     def query_cmm(self, key: int) -> float:
         ests = []
-        for r in range(self.d):
-            v = self.table[self._idx(r, key)]
+        for r, idx in enumerate(self._idxs(key)):
+            v = self.table[idx]
             coll = (self.row_totals[r] - v) / max(1, (self.w - 1)) 
             ests.append(max(0.0, v - coll))
         return min(ests)
@@ -72,3 +157,14 @@ class CMS:
         for r in range(self.d):                   
             self.row_totals[r] += other.row_totals[r]
         self.total_updates += other.total_updates
+
+    def copy(self) -> "CMS":
+        """Counter snapshot with the same w, d and seeds (index cache not carried over)."""
+        return CMS(w=self.w, d=self.d, seeds=list(self.seeds), table=list(self.table),
+                   total_updates=self.total_updates, row_totals=list(self.row_totals))
+
+    def cache_stats(self) -> dict:
+        if self.idx_cache is None:
+            return {"cache_size": 0, "cache_entries": 0, "cache_hits": 0, "cache_misses": 0,
+                    "cache_hit_rate": 0.0, "cache_bytes": 0}
+        return self.idx_cache.stats()
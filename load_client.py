@@ -1,17 +1,26 @@
 # load_client.py
 import time
 import random
+import select
+import socket
 import requests
 import argparse
 
 import numpy as np  # Used for Zipf sampling (pip install numpy)
 
+from stream_proto import ACK, encode_records
+
 SERVER_URL = "http://127.0.0.1:8000/update"
+BATCH_URL = "http://127.0.0.1:8000/batch_update"
+WS_URL = "ws://127.0.0.1:8000/ingest"
+TCP_ADDR = ("127.0.0.1", 9000)    # server must run with CMS_TCP_PORT=9000
 
 # Default configuration
 DEFAULT_RATE_PER_SEC = 1000       # Updates per second
 DEFAULT_DURATION_SEC = 10         # Total running time (seconds)
 KEY_SPACE = 100_000               # Key space [0, KEY_SPACE)
+DEFAULT_BATCH_SIZE = 100          # Records per request / frame (batch, ws, tcp)
+DEFAULT_WINDOW = 16_384           # Max unacked records in flight (ws, tcp)
 _ZIPF_CDF = None
 _ZIPF_ALPHA = None
 
@@ -44,7 +53,109 @@ def sample_zipf(alpha: float) -> int:
     # idx is in [0, KEY_SPACE-1]
     return int(idx)
 
+def _paced(rate: int, duration: int, batch_size: int, next_key):
+    """
+    Yield lists of (key, 1) pairs of length batch_size, paced so that the
+    overall rate stays near `rate` updates/s, until `duration` has elapsed.
+    """
+    interval = batch_size / rate          # Target interval between batches
+    end_time = time.time() + duration
+    while time.time() < end_time:
+        start_loop = time.time()
+        yield [(int(next_key()), 1) for _ in range(batch_size)]
+
+        # Rate control to maintain target throughput
+        elapsed = time.time() - start_loop
+        sleep_time = interval - elapsed
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+
+def send_update(batches) -> int:
+    """One POST /update per record (original behaviour)."""
+    sent = 0
+    for batch in batches:
+        for key, c in batch:
+            try:
+                # Send POST request to /update endpoint
+                r = requests.post(SERVER_URL, json={"key": key, "c": c}, timeout=1.0)
+                # Uncomment if you want to see server responses:
+                # print(r.json())
+            except Exception as e:
+                print("Request error:", e)
+            sent += 1
+    return sent
+
+
+def send_batch(batches) -> int:
+    """One POST /batch_update per batch over a keep-alive session."""
+    sent = 0
+    with requests.Session() as s:
+        for batch in batches:
+            payload = {"updates": [{"key": k, "c": c} for k, c in batch]}
+            try:
+                s.post(BATCH_URL, json=payload, timeout=5.0)
+            except Exception as e:
+                print("Request error:", e)
+            sent += len(batch)
+    return sent
+
+
+def send_ws(batches, window: int) -> int:
+    """One binary frame per batch over a single WebSocket (pip install websockets)."""
+    from websockets.sync.client import connect
+
+    sent = acked = 0
+    with connect(WS_URL) as ws:
+        for batch in batches:
+            ws.send(encode_records(batch))
+            sent += len(batch)
+            # Drain pending acks; block only while the window is full
+            while True:
+                try:
+                    msg = ws.recv(timeout=None if sent - acked > window else 0)
+                except TimeoutError:
+                    break
+                acked = ACK.unpack(msg)[0]
+        ws.send("sync")
+        while acked < sent:
+            acked = ACK.unpack(ws.recv(timeout=10.0))[0]
+    return acked
+
+
+def send_tcp(batches, window: int) -> int:
+    """Raw TCP byte stream of records; half-close and wait for the final ack."""
+    sent = acked = 0
+    buf = b""
+
+    def read_acks(block: bool) -> None:
+        nonlocal acked, buf
+        r, _, _ = select.select([sock], [], [], None if block else 0)
+        if r:
+            chunk = sock.recv(1 << 12)
+            if not chunk:
+                raise ConnectionError("server closed the ingest connection")
+            buf += chunk
+            while len(buf) >= ACK.size:
+                acked = ACK.unpack_from(buf)[0]
+                buf = buf[ACK.size:]
+
+    with socket.create_connection(TCP_ADDR) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for batch in batches:
+            sock.sendall(encode_records(batch))
+            sent += len(batch)
+            read_acks(block=False)
+            while sent - acked > window:
+                read_acks(block=True)
+        sock.shutdown(socket.SHUT_WR)
+        while acked < sent:
+            read_acks(block=True)
+    return acked
+
+
 def main():
+    global SERVER_URL, BATCH_URL, WS_URL, TCP_ADDR
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--dist",
@@ -70,54 +181,67 @@ def main():
         default=DEFAULT_DURATION_SEC,
         help="Total running time (seconds)",
     )
+    parser.add_argument(
+        "--transport",
+        choices=["update", "batch", "ws", "tcp"],
+        default="update",
+        help="update: POST /update per key; batch: POST /batch_update; "
+             "ws: WebSocket /ingest stream; tcp: raw TCP stream (default: update)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Records per request/frame for batch, ws and tcp transports",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=DEFAULT_WINDOW,
+        help="Max unacknowledged records in flight for ws and tcp transports",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Server host")
+    parser.add_argument("--port", type=int, default=8000, help="HTTP/WebSocket port")
+    parser.add_argument("--tcp-port", type=int, default=9000, help="Raw TCP ingest port")
     args = parser.parse_args()
 
+    SERVER_URL = f"http://{args.host}:{args.port}/update"
+    BATCH_URL = f"http://{args.host}:{args.port}/batch_update"
+    WS_URL = f"ws://{args.host}:{args.port}/ingest"
+    TCP_ADDR = (args.host, args.tcp_port)
+
     rate = args.rate
     duration = args.duration
     dist = args.dist
     alpha = args.alpha
 
-    interval = 1.0 / rate        # Target interval between requests
-    end_time = time.time() + duration
+    transport = args.transport
+    batch_size = 1 if transport == "update" else args.batch_size
+
+    def next_key() -> int:
+        # Select key according to the chosen distribution
+        if dist == "uniform":
+            return sample_uniform()
+        return sample_zipf(alpha)
 
-    sent = 0
     print(f"Starting load generator:")
     print(f"  distribution = {dist}, alpha = {alpha if dist == 'zipf' else '-'}")
     print(f"  rate         = {rate} updates/s")
     print(f"  duration     = {duration} s")
     print(f"  key space    = [0, {KEY_SPACE})")
+    print(f"  transport    = {transport}, batch size = {batch_size}")
 
     start_all = time.time()
-
-    while time.time() < end_time:
-        start_loop = time.time()
-
-        # Select key according to the chosen distribution
-        if dist == "uniform":
-            key = sample_uniform()
-        else:
-            key = sample_zipf(alpha)
-
-        payload = {
-            "key": int(key),
-            "c": 1,
-        }
-
-        try:
-            # Send POST request to /update endpoint
-            r = requests.post(SERVER_URL, json=payload, timeout=1.0)
-            # Uncomment if you want to see server responses:
-            # print(r.json())
-        except Exception as e:
-            print("Request error:", e)
-
-        sent += 1
-
-        # Rate control to maintain target throughput
-        elapsed = time.time() - start_loop
-        sleep_time = interval - elapsed
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+    batches = _paced(rate, duration, batch_size, next_key)
+
+    if transport == "update":
+        sent = send_update(batches)
+    elif transport == "batch":
+        sent = send_batch(batches)
+    elif transport == "ws":
+        sent = send_ws(batches, args.window)
+    else:
+        sent = send_tcp(batches, args.window)
 
     total_time = time.time() - start_all
     print(f"Done. Total updates sent: {sent}")
@@ -107,6 +107,25 @@ def plot_skew_sensitivity(df: pd.DataFrame, outdir: Path, fixed_eps=None):
     out = outdir / f"skew_sensitivity_zipf_cu1.png"
     fig.tight_layout(); fig.savefig(out); plt.close(fig)
 
+def plot_throughput_vs_alpha(df: pd.DataFrame, outdir: Path):
+    # 热键索引缓存实验：zipf 下 updates/sec 随 alpha 变化，按缓存开/关分线
+    dfz = df[df["workload"]=="zipf"]
+    if dfz.empty or dfz["alpha"].nunique() < 2:
+        return
+    fig, ax = plt.subplots(figsize=(7,4.5))
+    for cs in sorted(dfz["cache_size"].unique()):
+        g = (dfz[dfz["cache_size"]==cs].groupby("alpha", as_index=False)
+                .agg({"updates_per_sec":"mean"})
+                .sort_values("alpha"))
+        ax.plot(g["alpha"], g["updates_per_sec"], marker="o",
+                label="cache off" if cs == 0 else f"cache {cs}")
+    ax.set_xlabel("Zipf alpha")
+    ax.set_ylabel("updates/sec")
+    ax.set_title("Throughput vs alpha — zipf, index cache on/off")
+    ax.legend()
+    out = outdir / "throughput_vs_alpha_cache.png"
+    fig.tight_layout(); fig.savefig(out); plt.close(fig)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--src", required=True, help="CSV (merged) file path")
@@ -116,12 +135,20 @@ def main():
 
     outdir = Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
     df = load_csv(Path(args.src))
+    # 旧结果没有这些列：视为无缓存、非 profile 运行
+    if "cache_size" not in df.columns:
+        df["cache_size"] = 0
+    if "profile" not in df.columns:
+        df["profile"] = 0
+    df = df[df["profile"]==0]
+    base = df[df["cache_size"]==0]
 
-    # 基本三类图
-    plot_error_vs_eps(df, outdir)
-    plot_rel_iqr_vs_eps(df, outdir)
-    plot_throughput_vs_w(df, outdir)
-    plot_skew_sensitivity(df, outdir, fixed_eps=args.skew_eps)
+    # 基本三类图（只用无缓存的行，避免缓存实验混入基线）
+    plot_error_vs_eps(base, outdir)
+    plot_rel_iqr_vs_eps(base, outdir)
+    plot_throughput_vs_w(base, outdir)
+    plot_skew_sensitivity(base, outdir, fixed_eps=args.skew_eps)
+    plot_throughput_vs_alpha(df, outdir)
 
     print(f"[done] plots in {outdir}")
 
@@ -0,0 +1,106 @@
+# profiling.py
+"""
+Low-overhead statistical stack sampler.
+
+A background thread snapshots every thread's Python stack via
+sys._current_frames() at a fixed interval and aggregates identical stacks.
+Output is Brendan Gregg's "collapsed stack" format (one `f1;f2;f3 count`
+line per stack), readable by flamegraph.pl, speedscope, inferno, etc.
+
+Nothing runs (and nothing is hooked) while a sampler is not started.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Leaf frames in these files are threads parked on a lock/queue/selector, not work
+_IDLE_FILES = {"threading.py", "queue.py", "selectors.py"}
+
+
+def _label(code) -> str:
+    return f"{code.co_name}@{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+
+
+class StackSampler:
+    def __init__(self, interval: float = 0.001,
+                 thread_ids: Optional[Iterable[int]] = None,
+                 exclude_ids: Iterable[int] = (),
+                 keep_idle: bool = False):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.exclude_ids = set(exclude_ids)
+        self.keep_idle = keep_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._t0 = 0.0
+
+    def start(self) -> "StackSampler":
+        self._stop.clear()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.elapsed += time.perf_counter() - self._t0
+        return self
+
+    def __enter__(self) -> "StackSampler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me or tid in self.exclude_ids:
+                    continue
+                if self.thread_ids is not None and tid not in self.thread_ids:
+                    continue
+                if not self.keep_idle and os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    # ---------- Output ----------
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, hottest first."""
+        return "".join(f"{';'.join(st)} {n}\n" for st, n in self.stacks.most_common())
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+    def hot_functions(self, top: int = 25) -> List[Dict]:
+        """Per-function self/total sample counts, sorted by self samples."""
+        self_n: Counter = Counter()
+        total_n: Counter = Counter()
+        for st, n in self.stacks.items():
+            self_n[st[-1]] += n
+            for fn in set(st):
+                total_n[fn] += n
+        all_n = sum(self.stacks.values()) or 1
+        rows: List[Tuple[str, int]] = sorted(total_n.items(), key=lambda kv: (-self_n[kv[0]], -kv[1]))
+        return [
+            {"function": fn, "self": self_n[fn], "total": tot,
+             "self_pct": 100.0 * self_n[fn] / all_n, "total_pct": 100.0 * tot / all_n}
+            for fn, tot in rows[:top]
+        ]
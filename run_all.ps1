@@ -15,26 +15,32 @@ $trials    = 3
 $Q         = 2000
 $alpha     = 1.0              # Zipf 参数
 $epsList   = @(0.002, 0.001, 0.0005)   # 扫描的 ε
+$alphaList = @(0.8, 1.0, 1.2, 1.5)     # 热键索引缓存实验扫描的 Zipf α
+$cacheSize = 8192                      # 热键索引缓存容量
 $resultsDir= ".\results"
 $stamp     = Get-Date -Format "yyyyMMdd_HHmmss"
 $runDir    = Join-Path $resultsDir "run_$stamp"
+$sweepDir  = Join-Path $runDir "alpha_cache_sweep"   # α/缓存扫描单独存放，避免混入基线合并结果
 
 # ---- 准备输出目录 ----
 New-Item -ItemType Directory -Force -Path $resultsDir | Out-Null
 New-Item -ItemType Directory -Force -Path $runDir | Out-Null
+New-Item -ItemType Directory -Force -Path $sweepDir | Out-Null
 $logFile = Join-Path $runDir "run.log"
 
 function Run-Job {
     param(
-        [string]$workload, [double]$eps, [int]$use_cu, [double]$alpha
+        [string]$workload, [double]$eps, [int]$use_cu, [double]$alpha, [int]$cache = 0,
+        [string]$outDir = $runDir
     )
     $cuTag = $(if ($use_cu -eq 1) {"cu"} else {"nocu"})
+    if ($cache -gt 0) { $cuTag = "{0}_cache{1}" -f $cuTag, $cache }
     $epsTag = ("{0:g}" -f $eps).Replace(".", "p")
     $outName = "{0}_{1}_eps{2}.csv" -f $workload, $cuTag, $epsTag
     if ($workload -eq "zipf") {
         $outName = "{0}_{1}_a{2}_eps{3}.csv" -f $workload, $cuTag, ("{0:g}" -f $alpha).Replace(".", "p"), $epsTag
     }
-    $outPath = Join-Path $runDir $outName
+    $outPath = Join-Path $outDir $outName
 
     $args = @("--eps", $eps, "--delta", $delta, "--N", $N, "--U", $U,
               "--workload", $workload, "--Q", $Q, "--trials", $trials,
@@ -46,6 +52,9 @@ function Run-Job {
     if ($use_cu -eq 1) {
         $args += @("--use_cu")
     }
+    if ($cache -gt 0) {
+        $args += @("--cache_size", $cache)
+    }
 
     $cmd = "$python $bench " + ($args -join " ")
     Write-Host ">>> $cmd"
@@ -66,30 +75,42 @@ foreach ($eps in $epsList) {
     Run-Job -workload "zipf" -eps $eps -use_cu 1 -alpha $alpha
 }
 
+# zipf α 扫描：热键索引缓存 off/on（固定 ε=0.001, CU on），写入 $sweepDir
+foreach ($a in $alphaList) {
+    Run-Job -workload "zipf" -eps 0.001 -use_cu 1 -alpha $a -outDir $sweepDir
+    Run-Job -workload "zipf" -eps 0.001 -use_cu 1 -alpha $a -cache $cacheSize -outDir $sweepDir
+}
+
 Write-Host "=== All runs finished. Merging CSVs... ==="
 Add-Content -Path $logFile -Value "=== All runs finished. Merging CSVs... ==="
 
-# ---- 合并所有本次 CSV ----
-$merged = Join-Path $runDir "all_results_merged.csv"
-$csvs = Get-ChildItem -Path $runDir -Filter *.csv | Where-Object { $_.Name -ne "all_results_merged.csv" }
-
-if ($csvs.Count -gt 0) {
-    $first = $true
-    Remove-Item -ErrorAction Ignore $merged
-    foreach ($f in $csvs) {
-        if ($first) {
-            Get-Content $f.FullName | Out-File -FilePath $merged -Encoding UTF8
-            $first = $false
-        } else {
-            (Get-Content $f.FullName | Select-Object -Skip 1) | Out-File -Append -FilePath $merged -Encoding UTF8
+# ---- 合并 CSV：基线与 α/缓存扫描分别合并 ----
+function Merge-Csvs {
+    param([string]$dir)
+    $merged = Join-Path $dir "all_results_merged.csv"
+    $csvs = Get-ChildItem -Path $dir -Filter *.csv | Where-Object { $_.Name -ne "all_results_merged.csv" }
+
+    if ($csvs.Count -gt 0) {
+        $first = $true
+        Remove-Item -ErrorAction Ignore $merged
+        foreach ($f in $csvs) {
+            if ($first) {
+                Get-Content $f.FullName | Out-File -FilePath $merged -Encoding UTF8
+                $first = $false
+            } else {
+                (Get-Content $f.FullName | Select-Object -Skip 1) | Out-File -Append -FilePath $merged -Encoding UTF8
+            }
         }
+        Write-Host "Merged to: $merged"
+        Add-Content -Path $logFile -Value "Merged to: $merged"
+    } else {
+        Write-Host "No CSVs found to merge in $dir."
+        Add-Content -Path $logFile -Value "No CSVs found to merge in $dir."
     }
-    Write-Host "Merged to: $merged"
-    Add-Content -Path $logFile -Value "Merged to: $merged"
-} else {
-    Write-Host "No CSVs found to merge."
-    Add-Content -Path $logFile -Value "No CSVs found to merge."
 }
 
+Merge-Csvs -dir $runDir
+Merge-Csvs -dir $sweepDir
+
 Write-Host "=== Done. Results in $runDir ==="
 Add-Content -Path $logFile -Value "=== Done. Results in $runDir ==="
@@ -1,7 +1,44 @@
+import random
 from collections import Counter
 from cms import CMS
 from workloads import UniformKeys
 
+def check_index_cache():
+    # 热键索引缓存不能改变结果：容量很小以强制 CLOCK 淘汰
+    from workloads import ZipfKeys
+    gen = ZipfKeys(U=5000, alpha=1.1, seed=11)
+    keys = [gen.sample() for _ in range(30000)]
+    for upd in ("update", "update_cu"):
+        plain = CMS.from_eps_delta(0.01, 1e-2, seed=2)
+        cached = CMS.from_eps_delta(0.01, 1e-2, seed=2, cache_size=7)
+        for k in keys:
+            getattr(plain, upd)(k, 1)
+            getattr(cached, upd)(k, 1)
+        assert plain.table == cached.table and plain.row_totals == cached.row_totals, upd
+        for k in range(1, 200):
+            assert plain.query_min(k) == cached.query_min(k)
+            assert plain.query_mean(k) == cached.query_mean(k)
+            assert plain.query_cmm(k) == cached.query_cmm(k)
+        st = cached.cache_stats()
+        assert st["cache_misses"] > st["cache_size"]   # 确实发生了淘汰
+        print(f"index cache ({upd}, size 7, hit rate {st['cache_hit_rate']:.2f}) == uncached: OK")
+
+def check_hash_columns():
+    # sketch_diff.hash_columns（numpy 向量化）必须与 CMS._idx 完全一致
+    try:
+        from sketch_diff import hash_columns
+    except ImportError:
+        print("hash_columns check skipped (numpy not installed)")
+        return
+    rng = random.Random(3)
+    c = CMS.from_eps_delta(0.001, 1e-3, seed=5)
+    keys = [rng.getrandbits(64) for _ in range(2000)] + [0, 1, -1, -12345, (1 << 64) + 7, (1 << 70) - 3]
+    cols = hash_columns(c, keys)
+    for r in range(c.d):
+        for i, k in enumerate(keys):
+            assert cols[r][i] + r * c.w == c._idx(r, k), (r, k)
+    print(f"hash_columns == CMS._idx for {len(keys)} keys x {c.d} rows: OK")
+
 def main():
     eps, delta = 0.001, 1e-3   
     cms = CMS.from_eps_delta(eps, delta, seed=1)
@@ -28,3 +65,5 @@ def main():
 
 if __name__ == "__main__":
     main()
+    check_index_cache()
+    check_hash_columns()
@@ -0,0 +1,32 @@
+# stream_proto.py
+"""
+Binary framing shared by the streaming ingest channels (WebSocket / raw TCP).
+
+Record : little-endian (key: int64, c: int64), 16 bytes, packed back to back.
+Ack    : little-endian uint64 = cumulative number of records applied so far.
+
+WebSocket: each binary message carries a whole number of records; the server
+acks every applied message. A text message "sync" asks for an immediate ack.
+TCP: records are a plain byte stream; the server acks every applied read
+chunk (at most ACK_EVERY records) and once more after the client half-closes
+its side. A stream that ends mid-record is closed without that final ack.
+"""
+
+import struct
+from typing import Iterable, List, Tuple
+
+RECORD = struct.Struct("<qq")
+ACK = struct.Struct("<Q")
+
+# Upper bound on records applied between two TCP acks
+ACK_EVERY = 4096
+
+
+def encode_records(pairs: Iterable[Tuple[int, int]]) -> bytes:
+    """Pack (key, c) pairs into one frame."""
+    return b"".join(RECORD.pack(k, c) for k, c in pairs)
+
+
+def decode_records(buf: bytes) -> List[Tuple[int, int]]:
+    """Unpack a frame; len(buf) must be a multiple of RECORD.size."""
+    return list(RECORD.iter_unpack(buf))
@@ -3,21 +3,39 @@
 Simple HTTP stream server exposing a Count-Min Sketch (CMS) instance.
 
 Endpoints:
-- POST /reset      : (re)initialize CMS with eps, delta, use_cu
+- POST /reset      : (re)initialize CMS with eps, delta (or w, d), use_cu, default estimator
 - POST /update     : single update (key, c)
 - POST /batch_update : batch updates
 - POST /query      : point query with estimator = min / mean / cmm
 - GET  /stats      : basic sketch statistics
+- WS   /ingest     : persistent binary ingest stream (see stream_proto.py)
+- POST /admin/profile : time-boxed stack-sampling profile of the running server
+- POST /snapshot   : store a named copy of the live sketch (cleared by /reset)
+- DELETE /snapshot/{name} : drop a stored snapshot
+- POST /diff       : top-k heavy changes between a stored snapshot and the live sketch
+
+If CMS_TCP_PORT is set, a raw TCP ingest listener speaking the same record
+format is started alongside the HTTP app.
 """
 
-from typing import List, Literal
+from typing import Dict, Iterable, List, Literal, Optional, Tuple
 
+import asyncio
+import logging
+import math
 import os
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+import threading
+import time
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from threading import Lock
 
 from cms import CMS 
+from profiling import StackSampler
+from stream_proto import ACK, ACK_EVERY, RECORD, decode_records
 
 
 # ----------Configuration & Global Status----------
@@ -27,37 +45,91 @@ DEFAULT_EPS = float(os.getenv("CMS_EPS", "1e-3"))
 DEFAULT_DELTA = float(os.getenv("CMS_DELTA", "1e-3"))
 DEFAULT_SEED = int(os.getenv("CMS_SEED", "1"))
 DEFAULT_USE_CU = os.getenv("CMS_USE_CU", "false").lower() == "true"
-
-app = FastAPI(title="CMS Stream Server", version="0.1")
+DEFAULT_CACHE_SIZE = int(os.getenv("CMS_CACHE_SIZE", "0"))   # 0 = no hot-key index cache
+TCP_HOST = os.getenv("CMS_TCP_HOST", "0.0.0.0")
+TCP_PORT = int(os.getenv("CMS_TCP_PORT", "0"))   # 0 = TCP ingest disabled
+MAX_PROFILE_SEC = float(os.getenv("CMS_MAX_PROFILE_SEC", "60"))
+MAX_SNAPSHOTS = int(os.getenv("CMS_MAX_SNAPSHOTS", "8"))   # each holds a full table copy
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    """Run the optional raw TCP ingest listener for the lifetime of the app."""
+    tcp_server = None
+    if TCP_PORT:
+        tcp_server = await asyncio.start_server(_handle_tcp_ingest, TCP_HOST, TCP_PORT)
+    try:
+        yield
+    finally:
+        if tcp_server is not None:
+            tcp_server.close()
+            await tcp_server.wait_closed()
+
+
+app = FastAPI(title="CMS Stream Server", version="0.1", lifespan=_lifespan)
+log = logging.getLogger(__name__)
 
 _cms_lock = Lock()
 _cms: CMS | None = None
 _use_cu: bool = DEFAULT_USE_CU
+_estimator: str = "min"   # used by /query when the request names no estimator
+_eps: float = DEFAULT_EPS
+_delta: float = DEFAULT_DELTA
+_profile_lock = Lock()   # at most one profiling session at a time
+_snapshots: Dict[str, CMS] = {}   # guarded by _cms_lock; cleared on every reset
 
 
 def _init_cms(eps: float = DEFAULT_EPS,
               delta: float = DEFAULT_DELTA,
               seed: int = DEFAULT_SEED,
-              use_cu: bool = DEFAULT_USE_CU) -> None:
-    """Initialize or reset the global CMS instance."""
-    global _cms, _use_cu
+              use_cu: bool = DEFAULT_USE_CU,
+              cache_size: int = DEFAULT_CACHE_SIZE,
+              w: Optional[int] = None,
+              d: Optional[int] = None,
+              estimator: str = "min") -> None:
+    """Initialize or reset the global CMS instance (explicit w, d take precedence over eps, delta)."""
+    global _cms, _use_cu, _estimator, _eps, _delta
     with _cms_lock:
-        _cms = CMS.from_eps_delta(eps, delta, seed=seed)
+        if w is not None and d is not None:
+            _cms = CMS.from_w_d(w, d, seed=seed, cache_size=cache_size)
+            # eps/delta implied by the explicit shape (inverse of from_eps_delta)
+            _eps, _delta = math.e / w, math.exp(-d)
+        else:
+            _cms = CMS.from_eps_delta(eps, delta, seed=seed, cache_size=cache_size)
+            _eps, _delta = eps, delta
         if _cms.row_totals is None:
             _cms.row_totals = [0] * _cms.d
         _use_cu = use_cu
+        _estimator = estimator
+        # old snapshots belong to the previous sketch; diffing against them is meaningless
+        _snapshots.clear()
 
 
 _init_cms()
 
 
+def _apply_updates(pairs: Iterable[Tuple[int, int]]) -> int:
+    """Apply (key, c) pairs under a single lock hold; returns total_updates."""
+    if _cms is None:
+        raise HTTPException(status_code=500, detail="CMS not initialized")
+    with _cms_lock:
+        upd = _cms.update_cu if _use_cu else _cms.update
+        for k, c in pairs:
+            upd(k, c)
+        return _cms.total_updates
+
+
 # ---------- Request/Response Model ----------
 
 class ResetRequest(BaseModel):
-    eps: float
-    delta: float
+    eps: Optional[float] = None
+    delta: Optional[float] = None
+    w: Optional[int] = None          # w, d: explicit shape, e.g. chosen by autotune.py
+    d: Optional[int] = None
     use_cu: bool = False
     seed: int = 1
+    cache_size: int = 0
+    estimator: Literal["min", "mean", "cmm"] = "min"
 
 
 class UpdateRequest(BaseModel):
@@ -71,7 +143,7 @@ class BatchUpdateRequest(BaseModel):
 
 class QueryRequest(BaseModel):
     key: int
-    estimator: Literal["min", "mean", "cmm"] = "min"
+    estimator: Optional[Literal["min", "mean", "cmm"]] = None   # None = server default
 
 
 class QueryResponse(BaseModel):
@@ -87,47 +159,86 @@ class StatsResponse(BaseModel):
     d: int
     w: int
     use_cu: bool
+    estimator: str
+    total_updates: int
+    cache_size: int
+    cache_entries: int
+    cache_hits: int
+    cache_misses: int
+    cache_hit_rate: float
+    cache_bytes: int
+
+
+class SnapshotRequest(BaseModel):
+    name: str
+
+
+class DiffRequest(BaseModel):
+    snapshot: str
+    candidates: List[int]
+    k: int = 10
+
+
+class DiffResponse(BaseModel):
+    snapshot: str
+    snapshot_total_updates: int
     total_updates: int
+    increases: List[Tuple[int, float]]
+    decreases: List[Tuple[int, float]]
+    warning: Optional[str] = None
+
+
+class ProfileRequest(BaseModel):
+    seconds: float = 5.0
+    interval_ms: float = 1.0
+    top: int = 25
+    format: Literal["json", "collapsed"] = "json"
+
+
+class ProfileResponse(BaseModel):
+    seconds: float
+    samples: int
+    hot_functions: List[dict]
+    collapsed: str
 
 
 # ---------- Routing implementation ----------
 
 @app.post("/reset")
 def reset(req: ResetRequest):
-    """reset CMS paremeters（eps, delta, use_cu, seed）."""
-    _init_cms(eps=req.eps, delta=req.delta, seed=req.seed, use_cu=req.use_cu)
+    """reset CMS paremeters（eps, delta or w, d, use_cu, seed, cache_size, estimator）."""
+    if req.cache_size < 0:
+        raise HTTPException(status_code=400, detail="cache_size must be >= 0")
+    if (req.w is None) != (req.d is None):
+        raise HTTPException(status_code=400, detail="w and d must be given together")
+    if req.w is not None and req.d is not None:
+        if req.w < 1 or req.d < 1:
+            raise HTTPException(status_code=400, detail="w and d must be >= 1")
+        shape = f"w={req.w}, d={req.d}"
+    elif req.eps is not None and req.delta is not None:
+        shape = f"eps={req.eps}, delta={req.delta}"
+    else:
+        raise HTTPException(status_code=400, detail="Provide either (eps, delta) or (w, d)")
+    _init_cms(eps=req.eps, delta=req.delta, seed=req.seed, use_cu=req.use_cu,
+              cache_size=req.cache_size, w=req.w, d=req.d, estimator=req.estimator)
     return {
         "status": "ok",
-        "message": f"CMS reset with eps={req.eps}, delta={req.delta}, use_cu={req.use_cu}, seed={req.seed}",
+        "message": f"CMS reset with {shape}, use_cu={req.use_cu}, seed={req.seed}, "
+                   f"cache_size={req.cache_size}, estimator={req.estimator}",
     }
 
 
 @app.post("/update")
 def update(req: UpdateRequest):
     """update single (i, c)."""
-    if _cms is None:
-        raise HTTPException(status_code=500, detail="CMS not initialized")
-    with _cms_lock:
-        if _use_cu:
-            _cms.update_cu(req.key, req.c)
-        else:
-            _cms.update(req.key, req.c)
-        total = _cms.total_updates
+    total = _apply_updates([(req.key, req.c)])
     return {"status": "ok", "total_updates": total}
 
 
 @app.post("/batch_update")
 def batch_update(req: BatchUpdateRequest):
     """Batch updates, suitable for load testing."""
-    if _cms is None:
-        raise HTTPException(status_code=500, detail="CMS not initialized")
-    with _cms_lock:
-        for u in req.updates:
-            if _use_cu:
-                _cms.update_cu(u.key, u.c)
-            else:
-                _cms.update(u.key, u.c)
-        total = _cms.total_updates
+    total = _apply_updates((u.key, u.c) for u in req.updates)
     return {"status": "ok", "total_updates": total, "num_updates": len(req.updates)}
 
 
@@ -137,19 +248,20 @@ def query(req: QueryRequest):
     if _cms is None:
         raise HTTPException(status_code=500, detail="CMS not initialized")
     with _cms_lock:
-        if req.estimator == "min":
+        estimator = req.estimator or _estimator
+        if estimator == "min":
             est = _cms.query_min(req.key)
-        elif req.estimator == "mean":
+        elif estimator == "mean":
             est = _cms.query_mean(req.key)
-        elif req.estimator == "cmm":
+        elif estimator == "cmm":
             est = _cms.query_cmm(req.key)
         else:
-            raise HTTPException(status_code=400, detail=f"Unknown estimator: {req.estimator}")
+            raise HTTPException(status_code=400, detail=f"Unknown estimator: {estimator}")
         total = _cms.total_updates
 
     return QueryResponse(
         key=req.key,
-        estimator=req.estimator,
+        estimator=estimator,
         estimate=float(est),
         total_updates=total,
     )
@@ -157,17 +269,19 @@ def query(req: QueryRequest):
 
 @app.get("/stats", response_model=StatsResponse)
 def stats():
-    """Returns the current sketch state (d, w, whether it is CU, etc.)."""
+    """Returns the current sketch state (d, w, whether it is CU, index cache, etc.)."""
     if _cms is None:
         raise HTTPException(status_code=500, detail="CMS not initialized")
     
     with _cms_lock:
-        eps = DEFAULT_EPS 
-        delta = DEFAULT_DELTA
+        eps = _eps
+        delta = _delta
         d = _cms.d
         w = _cms.w
         total = _cms.total_updates
         use_cu = _use_cu
+        estimator = _estimator
+        cache = _cms.cache_stats()
 
     return StatsResponse(
         eps=eps,
@@ -175,5 +289,161 @@ def stats():
         d=d,
         w=w,
         use_cu=use_cu,
+        estimator=estimator,
         total_updates=total,
+        **cache,
     )
+
+
+@app.post("/snapshot")
+def snapshot(req: SnapshotRequest):
+    """Store a copy of the live sketch under `name` (overwrites an existing one)."""
+    if _cms is None:
+        raise HTTPException(status_code=500, detail="CMS not initialized")
+    with _cms_lock:
+        if req.name not in _snapshots and len(_snapshots) >= MAX_SNAPSHOTS:
+            raise HTTPException(status_code=409,
+                                detail=f"Snapshot limit ({MAX_SNAPSHOTS}) reached; delete one first")
+        snap = _cms.copy()
+        _snapshots[req.name] = snap
+    return {"status": "ok", "name": req.name, "total_updates": snap.total_updates}
+
+
+@app.delete("/snapshot/{name}")
+def delete_snapshot(name: str):
+    """Drop a stored snapshot."""
+    with _cms_lock:
+        if _snapshots.pop(name, None) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown snapshot: {name}")
+    return {"status": "ok", "name": name}
+
+
+@app.post("/diff", response_model=DiffResponse)
+def diff(req: DiffRequest):
+    """
+    Top-k estimated increases/decreases (live - snapshot) among candidate keys.
+    Under CU the sketch is not linear, so the estimates are heuristic and the
+    response carries a warning.
+    """
+    if _cms is None:
+        raise HTTPException(status_code=500, detail="CMS not initialized")
+    if req.k < 1:
+        raise HTTPException(status_code=400, detail="k must be >= 1")
+    try:
+        from sketch_diff import heavy_changes  # 需要 numpy
+    except ImportError:
+        raise HTTPException(status_code=501, detail="/diff requires numpy (pip install numpy)")
+    with _cms_lock:
+        snap = _snapshots.get(req.snapshot)
+        if snap is None:
+            raise HTTPException(status_code=404,
+                                detail=f"Unknown snapshot: {req.snapshot} (snapshots are cleared by /reset)")
+        live = _cms.copy()
+        use_cu = _use_cu
+    try:
+        res = heavy_changes(snap, live, req.candidates, k=req.k)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return DiffResponse(
+        snapshot=req.snapshot,
+        snapshot_total_updates=snap.total_updates,
+        total_updates=live.total_updates,
+        warning=("conservative update is enabled: CU sketches are not linear, "
+                 "so change estimates are heuristic") if use_cu else None,
+        **res,
+    )
+
+
+@app.post("/admin/profile", response_model=ProfileResponse)
+def profile(req: ProfileRequest):
+    """
+    Sample all server threads for `seconds` and return hot functions plus
+    collapsed stacks (format=collapsed returns the flamegraph text only).
+    No sampler exists outside a session, so normal requests pay nothing.
+    """
+    if not (0 < req.seconds <= MAX_PROFILE_SEC):
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SEC}]")
+    if req.interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="interval_ms must be > 0")
+    if req.top < 1:
+        raise HTTPException(status_code=400, detail="top must be >= 1")
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    try:
+        sampler = StackSampler(interval=req.interval_ms / 1000.0,
+                               exclude_ids=[threading.get_ident()])
+        with sampler:
+            time.sleep(req.seconds)
+    finally:
+        _profile_lock.release()
+
+    if req.format == "collapsed":
+        return PlainTextResponse(sampler.collapsed())
+    return ProfileResponse(
+        seconds=sampler.elapsed,
+        samples=sampler.samples,
+        hot_functions=sampler.hot_functions(req.top),
+        collapsed=sampler.collapsed(),
+    )
+
+
+# ---------- Streaming ingest ----------
+
+@app.websocket("/ingest")
+async def ingest_ws(ws: WebSocket):
+    """Persistent ingest: binary frames of records in, cumulative acks out."""
+    await ws.accept()
+    applied = 0
+    try:
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            data = msg.get("bytes")
+            if data:
+                if len(data) % RECORD.size:
+                    await ws.close(code=1003, reason="frame is not a whole number of records")
+                    return
+                pairs = decode_records(data)
+                await run_in_threadpool(_apply_updates, pairs)
+                applied += len(pairs)
+            # ack every applied frame, so any client window makes progress
+            if data or msg.get("text") == "sync":
+                await ws.send_bytes(ACK.pack(applied))
+    except WebSocketDisconnect:
+        pass
+
+
+async def _handle_tcp_ingest(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Raw TCP ingest: byte stream of records; acks every applied read chunk and at EOF."""
+    buf = b""
+    applied = 0
+    try:
+        while True:
+            # reads are capped so at most ACK_EVERY records go unacked
+            chunk = await reader.read(ACK_EVERY * RECORD.size)
+            if not chunk:
+                break
+            buf += chunk
+            n = len(buf) - len(buf) % RECORD.size
+            if n == 0:
+                continue
+            pairs = decode_records(buf[:n])
+            buf = buf[n:]
+            await run_in_threadpool(_apply_updates, pairs)
+            applied += len(pairs)
+            writer.write(ACK.pack(applied))
+            await writer.drain()
+        if buf:
+            # trailing partial record: protocol error, close without the final ack
+            log.warning("TCP ingest from %s ended mid-record (%d stray bytes); %d records applied",
+                        writer.get_extra_info("peername"), len(buf), applied)
+            return
+        # client half-closed: final ack so it knows everything was applied
+        writer.write(ACK.pack(applied))
+        await writer.drain()
+    except (ConnectionError, HTTPException):
+        pass
+    finally:
+        writer.close()
+
@@ -11,9 +11,11 @@ class UniformKeys:
 
 class ZipfKeys:
     # 生成 1..U 的 Zipf 分布（alpha>0）
-    def __init__(self, U: int, alpha: float, seed: int = 43):
+    # offset>0 把排名循环平移：排名 r 的键变为 ((r + offset) mod U) + 1，用于构造分布漂移
+    def __init__(self, U: int, alpha: float, seed: int = 43, offset: int = 0):
         self.U = U
         self.alpha = alpha
+        self.offset = offset
         self.rng = random.Random(seed)
         # 预计算归一化常数
         self.cdf = []
@@ -33,4 +35,4 @@ class ZipfKeys:
                 hi = mid
             else:
                 lo = mid + 1
-        return lo + 1  # 键空间从 1 开始
+        return (lo + self.offset) % self.U + 1  # 键空间从 1 开始